@@ -8,6 +8,9 @@ import common
 
 rate_limit_seconds = 5.0
 
+mapset_url = 'https://bloodcat.com/osu/s/'
+search_url = 'https://bloodcat.com/osu/?c=s&mod=json&q='
+
 
 class ConnectionError(Exception):
     pass
@@ -31,13 +34,23 @@ def mapset_unavailable(r: requests.Response) -> bool:
 
 class Downloader(common.Downloader):
     def __init__(self) -> None:
-        self.sess = common.retrying_session()
+        self.sess = common.get_session()
         self.time_of_last_download = 0.0
 
     def check_availability(self, set_id: str) -> bool:
         try:
-            r = self.sess.get('https://bloodcat.com/osu/',
-                              params={'q': set_id, 'c': 's', 'mod': 'json'}, timeout=15)
+            r = self.sess.head(mapset_url + set_id,
+                               allow_redirects=True, timeout=15)
+        except requests.ConnectionError:
+            raise ConnectionError(f"Couldn't connect to bloodcat.")
+
+        if r.ok:
+            return not mapset_unavailable(r)
+        return self.search_availability(set_id)
+
+    def search_availability(self, set_id: str) -> bool:
+        try:
+            r = self.sess.get(search_url + parse.quote(set_id), timeout=15)
         except requests.ConnectionError:
             raise ConnectionError(f"Couldn't connect to bloodcat.")
 
@@ -46,7 +59,7 @@ class Downloader(common.Downloader):
                               "This might be a bug, or you might just have to try again.")
 
         try:
-            j = r.json()
+            j = common.loads(r.content)
             return len(j) != 0
         except:
             raise SearchError(f"bloodcat is sending unexpected responses.\n"
@@ -60,23 +73,19 @@ class Downloader(common.Downloader):
 
         print(f'[bloodcat] Downloading mapset #{id}')
         try:
-            dl = self.sess.get(f'https://bloodcat.com/osu/s/{id}', timeout=15)
+            dl = self.sess.get(mapset_url + id, timeout=15, stream=True)
         except requests.ConnectionError as e:
             raise ConnectionError(
                 f"Couldn't connect to bloodcat when downloading mapset #{id}.")
 
         if mapset_unavailable(dl):
+            dl.close()
             raise MapsetUnavailable(
                 f"Mapset #{id} doesn't exist or isn't available for download.")
         if not dl.ok:
+            dl.close()
             raise DownloadError(
                 f'Failed to download mapset #{id}: {dl.status_code} {dl.reason}')
 
-        filename = common.filename_re.search(dl.headers['content-disposition'])
-        if filename is None:
-            filename = f'{id}.osz'
-        else:
-            filename = parse.unquote(filename[1])
-            filename = common.path_special_chars.sub('_', filename)
-
-        self.safe_save_to_file(dl.content, path.join(dest_dir, filename))
+        filename = common.mapset_filename(dl, id, unquote=True)
+        self.safe_save_stream(dl, id, path.join(dest_dir, filename))
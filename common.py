@@ -1,15 +1,30 @@
-from multiprocessing import Queue
+from email.message import Message
 import os
+from queue import Queue
 import re
-import tempfile
-from typing import Optional, Tuple
+import threading
+from typing import IO, Any, Callable, Optional, Tuple
+from urllib import parse
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    from orjson import dumps, loads
+except ImportError:
+    import json
+
+    def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        return json.dumps(obj, default=default).encode()
+
+    loads = json.loads
+
+user_agent = 'github.com/iltrof/osumapdl'
+
 filename_re = re.compile('filename="(.*)"')
-path_special_chars = re.compile(r'[<>:"/\\|?*]')
+part_suffix = '.part'
+path_special_chars = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
 mapset_url_re = re.compile(r'osu\.ppy\.sh/(?:s|beatmapsets)/(\d+)')
 map_url_re = re.compile(
     r'osu\.ppy\.sh/(?:b(?:eatmaps)?|beatmapsets/\d+#(?:osu|taiko|fruits|mania))/(\d+)')
@@ -17,32 +32,93 @@ map_url_re = re.compile(
 
 def retrying_session(retries: int = 10, backoff: float = 0.2) -> requests.Session:
     s = requests.Session()
-    s.headers['User-Agent'] = 'github.com/iltrof/osumapdl'
+    s.headers.update({'User-Agent': user_agent})
     retry = Retry(total=retries, read=retries,
                   connect=retries, backoff_factor=backoff,
-                  status_forcelist=[429, 503])  # 429 TOO MANY REQUESTS, 503 SERVICE UNAVAILABLE
-    adapter = HTTPAdapter(max_retries=retry)
+                  status_forcelist=[429, 503],  # 429 TOO MANY REQUESTS, 503 SERVICE UNAVAILABLE
+                  allowed_methods=frozenset({'GET', 'HEAD'}),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4,
+                          pool_maxsize=16, pool_block=False)
     s.mount('http://', adapter)
     s.mount('https://', adapter)
     return s
 
 
+def mapset_filename(dl: requests.Response, id: str, unquote: bool = False) -> str:
+    disposition = dl.headers.get('content-disposition', '')
+    header = Message()
+    header['content-disposition'] = disposition
+    name = header.get_filename()
+    if name is None:
+        # Malformed enough that the email parser gave up.
+        filename = filename_re.search(disposition)
+        if filename is None:
+            return f'{id}.osz'
+        name = filename[1]
+
+    if unquote:
+        name = parse.unquote(name)
+    return name.translate(path_special_chars)
+
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        _session = retrying_session()
+    return _session
+
+
+def temp_file_for(id: str, file: str) -> IO[bytes]:
+    # Same folder as the target, so that os.replace never crosses filesystems.
+    # The name is fixed per mapset, so a download cut short by quitting is
+    # overwritten by the next attempt instead of piling up.
+    return open(os.path.join(os.path.dirname(file), id + part_suffix), 'wb')
+
+
+class JobSlot:
+    def __init__(self) -> None:
+        self._job = ''
+        self._ready = threading.Event()
+
+    def put(self, job: str) -> None:
+        self._job = job
+        self._ready.set()
+
+    def get(self) -> str:
+        self._ready.wait()
+        self._ready.clear()
+        return self._job
+
+
 class Downloader:
     def download_mapset(self, id: str, dest_dir: str) -> None:
         pass
 
-    def safe_save_to_file(self, content: bytes, file: str) -> None:
-        temp = tempfile.NamedTemporaryFile(delete=False)
-        temp.write(content)
+    def safe_save_stream(self, dl: requests.Response, id: str, file: str) -> None:
+        temp = temp_file_for(id, file)
+        try:
+            for chunk in dl.iter_content(chunk_size=1 << 16):
+                if chunk:
+                    temp.write(chunk)
+        except:
+            temp.close()
+            os.remove(temp.name)
+            raise
+        finally:
+            dl.close()
         temp.close()
 
-        os.rename(temp.name, file)
+        os.replace(temp.name, file)
 
     def download_mapsets(
         self,
         name: str,
         dest_dir: str,
-        in_queue: 'Queue[str]',
+        in_queue: JobSlot,
         out_queue: 'Queue[Tuple[str, str, Optional[Exception]]]',
     ) -> None:
         while True:
@@ -1,17 +1,23 @@
 import argparse
-import configparser
-import json
-from multiprocessing import Process, Queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
 import os
+import re
+from queue import Empty, Queue
 import sys
+from threading import Thread, Timer
 import time
 import traceback
-from typing import Optional, Set, Tuple
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
 
 import bloodcat
+import common
 import messages
 import osu
 
+log = logging.getLogger('osumapdl')
+
 parser = argparse.ArgumentParser(usage='%(prog)s [options] ids_file')
 parser.add_argument('--cfg', dest='cfg_file', metavar='cfg-file',
                     action='store', help='config file to use', default='dlconfig.ini')
@@ -35,6 +41,8 @@ osu_args.add_argument('--video', dest='with_video', action='store_true',
                       help='downloads maps with video whenever possible (only for osu, not bloodcat)')
 osu_args.add_argument('--no-video', dest='with_video', action='store_false',
                       help='downloads maps without video (only for osu, not bloodcat)')
+osu_args.add_argument('--hourly-limit', dest='osu_hourly_limit', type=int, metavar='N',
+                      action='store', help='downloads per hour to stay under on osu! (0 = no limit)')
 
 bloodcat_args = parser.add_argument_group(
     'bloodcat', 'bloodcat-related arguments')
@@ -44,10 +52,10 @@ bloodcat_args.add_argument('--no-bloodcat', dest='use_bloodcat',
                            action='store_false', help='disables downloading via bloodcat')
 parser.set_defaults(use_osu=None, use_bloodcat=None, with_video=None)
 
-
-def cooldown(secs: float, queue: 'Queue[Tuple[str, str, Optional[Exception]]]') -> None:
-    time.sleep(secs)
-    queue.put(('timer', '', None))
+config_section_re = re.compile(r'^\s*\[([^\]]+)\]\s*$')
+config_option_re = re.compile(r'^\s*([^=:;#\s][^=:]*?)\s*[=:]\s*(.*?)\s*$')
+config_boolean_states = {'1': True, 'yes': True, 'true': True, 'on': True,
+                         '0': False, 'no': False, 'false': False, 'off': False}
 
 
 class FriendlyError(Exception):
@@ -64,52 +72,121 @@ class Args:
         self.out_dir = ''
         self.with_video = False
         self.max_errors_in_a_row = 5
+        self.osu_hourly_limit = 0
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire_nowait(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def time_until_available(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Bucket:
+    def __init__(self, ids: Iterable[str] = ()):
+        self._order = deque(dict.fromkeys(ids))
+        self.ids = set(self._order)
+
+    def add(self, id: str) -> None:
+        if id not in self.ids:
+            self.ids.add(id)
+            self._order.append(id)
+
+    def pop(self) -> str:
+        id = self._order.popleft()
+        self.ids.discard(id)
+        return id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._order)
+
+    def __ior__(self, other: Iterable[str]) -> 'Bucket':
+        for id in other:
+            self.add(id)
+        return self
+
+    def __isub__(self, other: Set[str]) -> 'Bucket':
+        removed = self.ids & other
+        if len(removed) > 0:
+            self._order = deque(id for id in self._order if id not in removed)
+            self.ids -= removed
+        return self
 
 
 class DownloadList:
-    def __init__(self, osu_and_bloodcat: Set[str], osu_only: Set[str], bloodcat_only: Set[str]):
-        self.osu_and_bloodcat = osu_and_bloodcat
-        self.osu_only = osu_only
-        self.bloodcat_only = bloodcat_only
+    def __init__(self, osu_and_bloodcat: Iterable[str], osu_only: Iterable[str], bloodcat_only: Iterable[str]):
+        self.osu_and_bloodcat = Bucket(osu_and_bloodcat)
+        self.osu_only = Bucket(osu_only)
+        self.bloodcat_only = Bucket(bloodcat_only)
         self.resumed = False
+        self._count = len(self.osu_and_bloodcat) + len(self.osu_only) + len(self.bloodcat_only)
+
+    def add(self, bucket: Bucket, id: str) -> None:
+        if id not in bucket:
+            bucket.add(id)
+            self._count += 1
 
-    def remove_already_downloaded(self, already_dled: Set[str]):
-        self.osu_and_bloodcat -= already_dled
-        self.osu_only -= already_dled
-        self.bloodcat_only -= already_dled
+    def has_next_for_osu(self) -> bool:
+        return len(self.osu_only) > 0 or len(self.osu_and_bloodcat) > 0
 
     def next_for_osu(self) -> Optional[str]:
-        if len(self.osu_only) > 0:
-            return self.osu_only.pop()
-        elif len(self.osu_and_bloodcat) > 0:
-            return self.osu_and_bloodcat.pop()
-        return None
+        return self._pop(self.osu_only) or self._pop(self.osu_and_bloodcat)
 
     def next_for_bloodcat(self) -> Optional[str]:
-        if len(self.bloodcat_only) > 0:
-            return self.bloodcat_only.pop()
-        elif len(self.osu_and_bloodcat) > 0:
-            return self.osu_and_bloodcat.pop()
-        return None
+        return self._pop(self.bloodcat_only) or self._pop(self.osu_and_bloodcat)
+
+    def _pop(self, bucket: Bucket) -> Optional[str]:
+        if len(bucket) == 0:
+            return None
+        self._count -= 1
+        return bucket.pop()
 
     def __len__(self) -> int:
-        return len(self.osu_and_bloodcat) + len(self.osu_only) + len(self.bloodcat_only)
+        return self._count
 
     def __isub__(self, other: Set[str]) -> 'DownloadList':
-        self.osu_and_bloodcat -= other
-        self.osu_only -= other
-        self.bloodcat_only -= other
+        for bucket in (self.osu_and_bloodcat, self.osu_only, self.bloodcat_only):
+            removed = bucket.ids & other
+            self._count -= len(removed)
+            bucket -= removed
         return self
 
 
 def main() -> int:
+    log.addHandler(logging.StreamHandler(sys.stdout))
+    log.setLevel(logging.INFO)
+    log.propagate = False
     try:
         return _main()
     except FriendlyError as e:
         print(e)
         return 1
-    except Exception as e:
-        print(f'Unexpected error. Please report this.')
+    except Exception:
+        print('Unexpected error. Please report this.')
         traceback.print_exc()
         return 1
 
@@ -126,6 +203,7 @@ def _main() -> int:
         raise FriendlyError(messages.no_download_sources)
 
     os.makedirs(args.out_dir, exist_ok=True)
+    remove_stale_parts(args.out_dir)
     dl_list = read_ids(args.ids_file)
     dl_list -= scan_existing_sets(args.out_dir)
 
@@ -149,19 +227,18 @@ def _main() -> int:
 def parse_args() -> Args:
     args = parser.parse_args()
 
-    cfg = configparser.ConfigParser(
-        allow_no_value=True, empty_lines_in_values=False)
-    cfg.read(args.cfg_file)
+    cfg = read_config(args.cfg_file)
 
     result = Args()
     result.ids_file = str(args.ids_file)
     result.out_dir = str(args.out_dir)
     result.max_errors_in_a_row = args.max_errors_in_a_row
-    result.use_osu = cfg.getboolean('osu', 'use', fallback=True)
-    result.use_bloodcat = cfg.getboolean('bloodcat', 'use', fallback=True)
-    result.osu_username = cfg.get('osu', 'username', fallback='')
-    result.osu_password = cfg.get('osu', 'password', fallback='')
-    result.with_video = cfg.getboolean('osu', 'video', fallback=False)
+    result.use_osu = config_bool(cfg, 'osu', 'use', True)
+    result.use_bloodcat = config_bool(cfg, 'bloodcat', 'use', True)
+    result.osu_username = cfg.get(('osu', 'username'), '')
+    result.osu_password = cfg.get(('osu', 'password'), '')
+    result.with_video = config_bool(cfg, 'osu', 'video', False)
+    result.osu_hourly_limit = config_int(cfg, 'osu', 'hourly_limit', 0)
     if args.use_osu is not None:
         result.use_osu = bool(args.use_osu)
     if args.use_bloodcat is not None:
@@ -172,34 +249,94 @@ def parse_args() -> Args:
         result.osu_password = str(args.osu_password)
     if args.with_video is not None:
         result.with_video = bool(args.with_video)
+    if args.osu_hourly_limit is not None:
+        result.osu_hourly_limit = int(args.osu_hourly_limit)
     return result
 
 
+def read_config(file: str) -> Dict[Tuple[str, str], str]:
+    try:
+        with open(file, encoding='utf-8-sig') as f:
+            return parse_config(f.read())
+    except OSError:
+        return {}
+
+
+def parse_config(text: str) -> Dict[Tuple[str, str], str]:
+    cfg: Dict[Tuple[str, str], str] = {}
+    section = ''
+    for line in text.splitlines():
+        match = config_section_re.match(line)
+        if match is not None:
+            section = match[1]
+            continue
+        match = config_option_re.match(line)
+        if match is not None:
+            cfg[(section, match[1].lower())] = match[2]
+    return cfg
+
+
+def config_bool(cfg: Dict[Tuple[str, str], str], section: str, key: str, default: bool) -> bool:
+    value = cfg.get((section, key))
+    if value is None:
+        return default
+    try:
+        return config_boolean_states[value.lower()]
+    except KeyError:
+        raise FriendlyError(messages.bad_config_value(section, key, value))
+
+
+def config_int(cfg: Dict[Tuple[str, str], str], section: str, key: str, default: int) -> int:
+    value = cfg.get((section, key))
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise FriendlyError(messages.bad_config_number(section, key, value))
+
+
+def remove_stale_parts(dir: str) -> None:
+    # Left behind by downloads that were interrupted in an earlier run.
+    for name in os.listdir(dir):
+        if name.endswith(common.part_suffix) and name[:-len(common.part_suffix)].isdigit():
+            try:
+                os.remove(os.path.join(dir, name))
+            except OSError:
+                pass
+
+
 def scan_existing_sets(dir: str) -> Set[str]:
-    sets = {item.name.split()[0] for item in os.scandir(dir)}
-    return {s for s in sets if s.isdigit()}
+    sets = set()
+    for name in os.listdir(dir):
+        prefix = name.partition(' ')[0]
+        if prefix.isdigit():
+            sets.add(prefix)
+    return sets
 
 
 def read_ids(ids_file: str) -> DownloadList:
     if ids_file.lower().endswith('.resume'):
         return read_resume_file(ids_file)
 
-    with open(ids_file) as f:
-        ids = [line.strip() for line in f]
-        return DownloadList(
-            osu_and_bloodcat={id for id in ids if id != ''},
-            osu_only=set(), bloodcat_only=set(),
-        )
+    with open(ids_file, 'rb') as f:
+        ids = [id.decode() for id in dict.fromkeys(f.read().split())]
+    return DownloadList(osu_and_bloodcat=ids, osu_only=set(), bloodcat_only=set())
 
 
 def read_resume_file(file: str) -> DownloadList:
-    with open(file) as f:
+    with open(file, 'rb') as f:
         try:
-            j = json.load(f)
+            j = common.loads(f.read())
+            osu_only = Bucket(j['osu_exc'])
+            bloodcat_only = Bucket(j['bloodcat_exc'])
+            bloodcat_only -= osu_only.ids
+            osu_and_bloodcat = Bucket(j['set_ids'])
+            osu_and_bloodcat -= osu_only.ids | bloodcat_only.ids
             dl_list = DownloadList(
-                osu_and_bloodcat=set(j['set_ids']),
-                osu_only=set(j['osu_exc']),
-                bloodcat_only=set(j['bloodcat_exc']),
+                osu_and_bloodcat=osu_and_bloodcat,
+                osu_only=osu_only,
+                bloodcat_only=bloodcat_only,
             )
             dl_list.resumed = True
             return dl_list
@@ -229,54 +366,121 @@ def update_bloodcat_availability(dl_list: DownloadList, bloodcat_dl: bloodcat.Do
     if dl_list.resumed:
         return
 
-    for i, set_id in enumerate(dl_list.osu_and_bloodcat):
-        print(f'{i+1} / {len(dl_list.osu_and_bloodcat)}', end='\r')
-        try:
-            available = bloodcat_dl.check_availability(set_id)
-            if not available:
-                dl_list.osu_only.add(set_id)
-        except (bloodcat.ConnectionError, bloodcat.SearchError) as e:
-            print('')
-            raise FriendlyError(e)
+    total = len(dl_list.osu_and_bloodcat)
+    unavailable: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        futures = {ex.submit(bloodcat_dl.check_availability, set_id): set_id
+                   for set_id in dl_list.osu_and_bloodcat}
+        for i, fut in enumerate(as_completed(futures)):
+            if i % 16 == 0 or i == total - 1:
+                sys.stdout.write(f'{i+1} / {total}\r')
+                sys.stdout.flush()
+            try:
+                if not fut.result():
+                    unavailable.add(futures[fut])
+            except (bloodcat.ConnectionError, bloodcat.SearchError) as e:
+                for f in futures:
+                    f.cancel()
+                print('')
+                raise FriendlyError(e)
 
     print('')
-    dl_list.osu_and_bloodcat -= dl_list.osu_only
+    dl_list.osu_only |= unavailable
+    dl_list.osu_and_bloodcat -= unavailable
 
 
 def write_resume_file(ids_file: str, dl_list: DownloadList) -> None:
     if ids_file.lower().endswith('.resume'):
         return
 
-    resume_file = ids_file + '.resume'
-    with open(resume_file, 'w') as f:
-        json.dump({
-            'set_ids': list(dl_list.osu_and_bloodcat),
-            'osu_exc': list(dl_list.osu_only),
-            'bloodcat_exc': list(dl_list.bloodcat_only),
-        }, f)
-
+    resume_file = resume_file_name(ids_file)
+    save_resume_file(resume_file, dl_list)
     print(messages.created_resume_file(ids_file, resume_file))
 
 
+def resume_file_name(ids_file: str) -> str:
+    if ids_file.lower().endswith('.resume'):
+        return ids_file
+    return ids_file + '.resume'
+
+
+def save_resume_file(resume_file: str, dl_list: DownloadList) -> None:
+    data = memoryview(common.dumps({
+        'set_ids': dl_list.osu_and_bloodcat,
+        'osu_exc': dl_list.osu_only,
+        'bloodcat_exc': dl_list.bloodcat_only,
+    }, default=list))
+
+    temp = resume_file + '.tmp'
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    fd = os.open(temp, flags, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+    os.replace(temp, resume_file)
+
+
 def download(dl_list: DownloadList, args: Args, osu_dl: osu.Downloader, bloodcat_dl: bloodcat.Downloader) -> int:
-    osu_queue: 'Queue[str]' = Queue(maxsize=1)
-    bloodcat_queue: 'Queue[str]' = Queue(maxsize=1)
+    osu_queue = common.JobSlot()
+    bloodcat_queue = common.JobSlot()
     results_queue: 'Queue[Tuple[str, str, Optional[Exception]]]' = Queue()
 
-    osu_proc = Process()
-    bloodcat_proc = Process()
-    osu_cooldown_proc = Process()
+    osu_proc: Optional[Thread] = None
+    bloodcat_proc: Optional[Thread] = None
+    osu_cooldown: Optional[Timer] = None
+    osu_bucket: Optional[TokenBucket] = None
+    if args.osu_hourly_limit > 0:
+        osu_bucket = TokenBucket(args.osu_hourly_limit, 60*60)
+    osu_throttled = False
+    osu_waited_for_token = False
 
     osu_busy = False
     bloodcat_busy = False
     osu_errors_in_a_row = 0
     bloodcat_errors_in_a_row = 0
 
-    missing_on_osu = dl_list.bloodcat_only.copy()
-    missing_on_bloodcat = dl_list.osu_only.copy()
+    missing_on_osu = dl_list.bloodcat_only.ids.copy()
+    missing_on_bloodcat = dl_list.osu_only.ids.copy()
+    remaining = dl_list.osu_and_bloodcat.ids | dl_list.osu_only.ids | dl_list.bloodcat_only.ids
+    resume_dirty = False
+    last_checkpoint = time.monotonic()
+
+    def refresh_resume_file():
+        nonlocal resume_dirty, last_checkpoint
+        if not resume_dirty or not args.use_osu or not args.use_bloodcat:
+            return
+        save_resume_file(resume_file_name(args.ids_file), DownloadList(
+            osu_and_bloodcat=remaining - missing_on_osu - missing_on_bloodcat,
+            osu_only=remaining & missing_on_bloodcat,
+            bloodcat_only=remaining & missing_on_osu,
+        ))
+        resume_dirty = False
+        last_checkpoint = time.monotonic()
+
+    def start_osu_cooldown(secs: float) -> None:
+        nonlocal osu_busy, osu_cooldown
+        osu_busy = True
+        osu_cooldown = Timer(secs, results_queue.put,
+                             args=(('timer', '', None),))
+        osu_cooldown.daemon = True
+        osu_cooldown.start()
 
     def fill_queues():
-        nonlocal osu_busy, bloodcat_busy
+        nonlocal osu_busy, bloodcat_busy, osu_throttled, osu_waited_for_token
+        if args.use_osu and not osu_busy and osu_bucket is not None \
+                and dl_list.has_next_for_osu():
+            if osu_bucket.acquire_nowait():
+                # Still throttled if this token only came after a pause.
+                osu_throttled = osu_waited_for_token
+                osu_waited_for_token = False
+            else:
+                if not osu_throttled:
+                    print(messages.osu_rate_limited(round(60*60 / args.osu_hourly_limit)))
+                osu_throttled = True
+                osu_waited_for_token = True
+                start_osu_cooldown(osu_bucket.time_until_available())
         if args.use_osu and not osu_busy:
             item = dl_list.next_for_osu()
             if item is not None:
@@ -289,104 +493,152 @@ def download(dl_list: DownloadList, args: Args, osu_dl: osu.Downloader, bloodcat
                 bloodcat_queue.put(item)
 
     def cleanup():
+        refresh_resume_file()
         if args.use_osu:
             osu_queue.put('stop')
         if args.use_bloodcat:
             bloodcat_queue.put('stop')
-        if osu_cooldown_proc.is_alive():
-            osu_cooldown_proc.kill()
+        if osu_cooldown is not None:
+            osu_cooldown.cancel()
 
     total = len(dl_list)
     if args.use_osu:
-        osu_proc = Process(target=osu_dl.download_mapsets, args=(
+        osu_proc = Thread(target=osu_dl.download_mapsets, args=(
             'osu', args.out_dir, osu_queue, results_queue,
-        ))
+        ), daemon=True)
         osu_proc.start()
     if args.use_bloodcat:
-        bloodcat_proc = Process(target=bloodcat_dl.download_mapsets, args=(
+        bloodcat_proc = Thread(target=bloodcat_dl.download_mapsets, args=(
             'bloodcat', args.out_dir, bloodcat_queue, results_queue,
-        ))
+        ), daemon=True)
         bloodcat_proc.start()
 
+    done = 0
+
+    def mark_done(set_id: str) -> None:
+        nonlocal done, resume_dirty
+        done += 1
+        remaining.discard(set_id)
+        resume_dirty = True
+        if done % 16 == 0 or time.monotonic() - last_checkpoint > 5.0:
+            refresh_resume_file()
+
+    def mark_missing(missing: Set[str], set_id: str) -> None:
+        nonlocal resume_dirty
+        missing.add(set_id)
+        resume_dirty = True
+
+    def give_up(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal total
+        print('[info]', error)
+        remaining.discard(set_id)
+        total -= 1
+
+    def handle_timer(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal osu_busy
+        osu_busy = False
+
+    def handle_osu_done(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal osu_busy, osu_errors_in_a_row
+        mark_done(set_id)
+        osu_busy = False
+        osu_errors_in_a_row = 0
+
+    def handle_osu_unavailable(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal osu_busy
+        mark_missing(missing_on_osu, set_id)
+        if not args.use_bloodcat or set_id in missing_on_bloodcat:
+            give_up(set_id, error)
+        else:
+            dl_list.add(dl_list.bloodcat_only, set_id)
+        osu_busy = False
+
+    def handle_osu_quota(set_id: str, error: Optional[Exception]) -> None:
+        print(messages.download_limit_reached('five minutes'))
+        if args.use_bloodcat and set_id not in missing_on_bloodcat:
+            dl_list.add(dl_list.osu_and_bloodcat, set_id)
+        else:
+            dl_list.add(dl_list.osu_only, set_id)
+
+        start_osu_cooldown(60*5)
+
+    def retry_osu(set_id: str, error: Optional[Exception]) -> bool:
+        nonlocal osu_errors_in_a_row
+        if osu_errors_in_a_row < args.max_errors_in_a_row:
+            osu_errors_in_a_row += 1
+            osu_queue.put(set_id)
+            return True
+
+        log.error("[osu] Couldn't download mapset #%s:\n%s", set_id, error)
+        return False
+
+    def handle_bloodcat_done(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal bloodcat_busy, bloodcat_errors_in_a_row
+        mark_done(set_id)
+        bloodcat_busy = False
+        bloodcat_errors_in_a_row = 0
+
+    def handle_bloodcat_unavailable(set_id: str, error: Optional[Exception]) -> None:
+        nonlocal bloodcat_busy
+        mark_missing(missing_on_bloodcat, set_id)
+        if not args.use_osu or set_id in missing_on_osu:
+            give_up(set_id, error)
+        else:
+            dl_list.add(dl_list.osu_only, set_id)
+        bloodcat_busy = False
+
+    def retry_bloodcat(set_id: str, error: Optional[Exception]) -> bool:
+        nonlocal bloodcat_errors_in_a_row
+        if bloodcat_errors_in_a_row < args.max_errors_in_a_row:
+            bloodcat_errors_in_a_row += 1
+            bloodcat_queue.put(set_id)
+            return True
+
+        log.error("[bloodcat] Couldn't download mapset #%s:\n%s", set_id, error)
+        return False
+
+    handlers: Dict[Tuple[str, type], Callable[[str, Optional[Exception]], None]] = {
+        ('timer', type(None)): handle_timer,
+        ('osu', type(None)): handle_osu_done,
+        ('osu', osu.MapsetUnavailable): handle_osu_unavailable,
+        ('osu', osu.QuotaExceeded): handle_osu_quota,
+        ('bloodcat', type(None)): handle_bloodcat_done,
+        ('bloodcat', bloodcat.MapsetUnavailable): handle_bloodcat_unavailable,
+    }
+    retry_handlers: Dict[str, Callable[[str, Optional[Exception]], bool]] = {
+        'osu': retry_osu,
+        'bloodcat': retry_bloodcat,
+    }
+
     fill_queues()
 
-    done = 0
     try:
         while done < total:
-            worker, set_id, error = results_queue.get()
-            if error is None:
-                if worker == 'timer':
-                    osu_busy = False
-                    fill_queues()
-                    continue
-
-                done += 1
+            events = [results_queue.get()]
+            try:
+                while True:
+                    events.append(results_queue.get_nowait())
+            except Empty:
+                pass
+
+            done_before = done
+            for worker, set_id, error in events:
+                handler = handlers.get((worker, type(error)))
+                if handler is not None:
+                    handler(set_id, error)
+                elif not retry_handlers[worker](set_id, error):
+                    cleanup()
+                    return 1
+
+            if done != done_before:
                 print(f'[progress] {done} / {total}')
-
-                if worker == 'osu':
-                    osu_busy = False
-                    osu_errors_in_a_row = 0
-                elif worker == 'bloodcat':
-                    bloodcat_busy = False
-                    bloodcat_errors_in_a_row = 0
-
-                fill_queues()
-            elif worker == 'osu' and isinstance(error, osu.MapsetUnavailable):
-                missing_on_osu.add(set_id)
-                if not args.use_bloodcat or set_id in missing_on_bloodcat:
-                    print('[info]', error)
-                    total -= 1
-                else:
-                    dl_list.bloodcat_only.add(set_id)
-
-                osu_busy = False
-                fill_queues()
-            elif worker == 'bloodcat' and isinstance(error, bloodcat.MapsetUnavailable):
-                missing_on_bloodcat.add(set_id)
-                if not args.use_osu or set_id in missing_on_osu:
-                    print('[info]', error)
-                    total -= 1
-                else:
-                    dl_list.osu_only.add(set_id)
-
-                bloodcat_busy = False
-                fill_queues()
-            elif worker == 'osu' and isinstance(error, osu.QuotaExceeded):
-                print(messages.download_limit_reached('five minutes'))
-                if args.use_bloodcat and set_id not in missing_on_bloodcat:
-                    dl_list.osu_and_bloodcat.add(set_id)
-                else:
-                    dl_list.osu_only.add(set_id)
-
-                osu_cooldown_proc = Process(
-                    target=cooldown, args=(60*5, results_queue))
-                osu_cooldown_proc.start()
-            elif worker == 'osu':  # and error is not None
-                if osu_errors_in_a_row < args.max_errors_in_a_row:
-                    osu_errors_in_a_row += 1
-                    osu_queue.put(set_id)
-                    continue
-
-                print(f"[osu] Couldn't download mapset #{set_id}:\n{error}")
-                cleanup()
-                return 1
-            elif worker == 'bloodcat':  # and error is not None
-                if bloodcat_errors_in_a_row < args.max_errors_in_a_row:
-                    bloodcat_errors_in_a_row += 1
-                    bloodcat_queue.put(set_id)
-                    continue
-
-                print(
-                    f"[bloodcat] Couldn't download mapset #{set_id}:\n{error}")
-                cleanup()
-                return 1
+            fill_queues()
     except:
-        if osu_proc.is_alive():
-            osu_proc.kill()
-        if bloodcat_proc.is_alive():
-            bloodcat_proc.kill()
-        if osu_cooldown_proc.is_alive():
-            osu_cooldown_proc.kill()
+        cleanup()
+        if osu_proc is not None and osu_proc.is_alive():
+            osu_proc.join(timeout=1)
+        if bloodcat_proc is not None and bloodcat_proc.is_alive():
+            bloodcat_proc.join(timeout=1)
         raise
 
     cleanup()
@@ -16,6 +16,18 @@ nothing_to_download = '''\
 Everything's already downloaded.'''
 
 
+def bad_config_value(section: str, key: str, value: str) -> str:
+    return f'''\
+The config file says "{key} = {value}" under [{section}],
+but it should be either yes or no.'''
+
+
+def bad_config_number(section: str, key: str, value: str) -> str:
+    return f'''\
+The config file says "{key} = {value}" under [{section}],
+but it should be a whole number.'''
+
+
 def bad_resume_file(path: str) -> str:
     return f'''\
 The given resume file ({path}) seems to be corrupted.
@@ -43,3 +55,9 @@ def download_limit_reached(cooldown_time: str) -> str:
 [info] You've reached the hourly download limit on osu!,
 so it's rejecting download requests for the moment.
 The script will try osu! again in {cooldown_time}.'''
+
+
+def osu_rate_limited(secs: int) -> str:
+    return f'''\
+[info] Slowing osu! downloads down to one every {secs} seconds
+to stay under the hourly limit from the config.'''
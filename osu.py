@@ -75,24 +75,22 @@ class Downloader(common.Downloader):
         print(f'[osu] Downloading mapset #{id}')
         try:
             dl = self.sess.get(f'https://osu.ppy.sh/beatmapsets/{id}/download', params={
-                               'noVideo': '0' if self.with_video else '1'}, timeout=15)
+                               'noVideo': '0' if self.with_video else '1'}, timeout=15, stream=True)
         except requests.ConnectionError:
             raise ConnectionError(
                 f"Couldn't connect to osu! when downloading mapset #{id}.")
 
         if mapset_unavailable(dl):
+            dl.close()
             raise MapsetUnavailable(
                 f"Mapset #{id} doesn't exist or isn't available for download.")
         if quota_exceeded(dl):
+            dl.close()
             raise QuotaExceeded()
         if not dl.ok:
+            dl.close()
             raise DownloadError(
                 f'Failed to download mapset #{id}: {dl.status_code} {dl.reason}')
 
-        filename = common.filename_re.search(dl.headers['content-disposition'])
-        if filename is None:
-            filename = f'{id}.osz'
-        else:
-            filename = common.path_special_chars.sub('_', filename[1])
-
-        self.safe_save_to_file(dl.content, path.join(dest_dir, filename))
+        filename = common.mapset_filename(dl, id)
+        self.safe_save_stream(dl, id, path.join(dest_dir, filename))
@@ -1,7 +1,10 @@
 import codecs
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
 import re
 import sys
-from typing import Optional, Set
+from typing import Dict, Optional, Set
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -11,6 +14,13 @@ if len(sys.argv) != 3:
     print('Usage: python from-links.py input-file output-file')
     exit(1)
 
+# Also the connection pool size, so that every worker keeps its socket alive.
+resolve_workers = 8
+
+# Map ID -> mapset ID, kept between runs. Only successful lookups are
+# stored, since a missing map might still show up on bloodcat later.
+cache_file = 'map-ids.json'
+
 mapset_url_re = re.compile(r'osu\.ppy\.sh/(?:s|beatmapsets)/(\d+)')
 map_url_re = re.compile(
     r'osu\.ppy\.sh/(?:b(?:eatmaps)?|beatmapsets/\d+#osu)/(\d+)')
@@ -22,16 +32,40 @@ def retrying_session(retries: int = 3, backoff: float = 2.0) -> requests.Session
     retry = Retry(total=retries, read=retries,
                   connect=retries, backoff_factor=backoff,
                   status_forcelist=[429])  # 429 TOO MANY REQUESTS
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=resolve_workers)
     s.mount('http://', adapter)
     s.mount('https://', adapter)
     return s
 
 
+session = retrying_session()
+
+
+def read_cache() -> Dict[str, str]:
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def write_cache(cache: Dict[str, str]) -> None:
+    try:
+        with open(cache_file + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(cache_file + '.tmp', cache_file)
+    except OSError as e:
+        print(f"Couldn't save resolved maps to {cache_file}: {e}")
+
+
+map_id_cache = read_cache()
+
+
 def resolve_map_id_osu(id: str) -> Optional[str]:
     try:
-        r = retrying_session().get(f'https://osu.ppy.sh/beatmaps/{id}',
-                                   allow_redirects=False, timeout=15)
+        r = session.get(f'https://osu.ppy.sh/beatmaps/{id}',
+                        allow_redirects=False, timeout=15)
     except requests.ConnectionError:
         raise ConnectionError(f"Couldn't connect to osu!\n"
                               "Check if the website even works and try again.")
@@ -56,8 +90,8 @@ def resolve_map_id_osu(id: str) -> Optional[str]:
 
 def resolve_map_id_bloodcat(id: str) -> Optional[str]:
     try:
-        r = retrying_session().get(f'https://bloodcat.com/osu/',
-                                   params={'q': id, 'c': 'b', 'mod': 'json'}, timeout=15)
+        r = session.get(f'https://bloodcat.com/osu/',
+                        params={'q': id, 'c': 'b', 'mod': 'json'}, timeout=15)
     except requests.ConnectionError:
         raise ConnectionError(f"Couldn't connect to bloodcat.")
 
@@ -92,37 +126,54 @@ def resolve_map_id(id: str) -> Optional[str]:
         raise RuntimeError(bloodcat_error, e)
 
 
+mapsets: Set[str] = set()
+maps: Set[str] = set()
 with codecs.open(sys.argv[1], 'r', 'utf-8') as f:
-    content = f.read()
-
-mapsets: Set[str] = set(mapset_url_re.findall(content))
-content = mapset_url_re.sub('', content)
-maps: Set[str] = set(map_url_re.findall(content))
+    for line in f:
+        found = mapset_url_re.findall(line)
+        if len(found) > 0:
+            mapsets.update(found)
+            line = mapset_url_re.sub('', line)
+        maps.update(map_url_re.findall(line))
 
 print(f'Found {len(mapsets)} links to mapsets and {len(maps)} links to maps.')
 if len(maps) > 0:
-    print(f'Resolving {len(maps)} links to maps...')
-
-    for i, id in enumerate(maps):
-        print(f'{i+1} / {len(maps)}', end='\r')
-        try:
-            set_id = resolve_map_id(id)
-            if set_id is None:
-                print(f"\nMap #{id} doesn't exist")
-                continue
-            mapsets.add(set_id)
-        except RuntimeError as e:
-            print(f'\nFailed to look up map #{id}.\n'
-                  f'[bloodcat] {e.args[0][0]}\n'
-                  f'[osu] {e.args[0][0]}')
-            exit(1)
+    unknown = [id for id in maps if id not in map_id_cache]
+    mapsets.update(map_id_cache[id] for id in maps if id in map_id_cache)
+    if len(unknown) < len(maps):
+        print(f'{len(maps) - len(unknown)} maps were already resolved before.')
+    if len(unknown) > 0:
+        print(f'Resolving {len(unknown)} links to maps...')
+
+    with ThreadPoolExecutor(max_workers=resolve_workers) as ex:
+        futures = {ex.submit(resolve_map_id, id): id for id in unknown}
+        for i, fut in enumerate(as_completed(futures)):
+            id = futures[fut]
+            print(f'{i+1} / {len(unknown)}', end='\r')
+            try:
+                set_id = fut.result()
+                if set_id is None:
+                    print(f"\nMap #{id} doesn't exist")
+                    continue
+                mapsets.add(set_id)
+                map_id_cache[id] = set_id
+            except RuntimeError as e:
+                for f in futures:
+                    f.cancel()
+                write_cache(map_id_cache)
+                print(f'\nFailed to look up map #{id}.\n'
+                      f'[bloodcat] {e.args[0]}\n'
+                      f'[osu] {e.args[1]}')
+                exit(1)
 
     print('')
     print(f'Collected a total of {len(mapsets)} mapsets.')
 
 print(f'Writing to {sys.argv[2]}...')
 with open(sys.argv[2], 'w') as f:
-    for id in mapsets:
-        f.write(id + '\n')
+    f.write(''.join(id + '\n' for id in mapsets))
+
+if len(maps) > 0:
+    write_cache(map_id_cache)
 
 print('Done!')
@@ -1,7 +1,9 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import re
 import sys
+import threading
 import time
-from typing import Optional, Set
+from typing import Any, List, Optional, Set
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -12,13 +14,17 @@ if len(sys.argv) not in [2, 3]:
     exit(1)
 
 
+# Pages fetched at once; the adapter keeps one pooled connection per page.
+pages_in_flight = 4
+
+
 def retrying_session(retries: int = 3, backoff: float = 2.5) -> requests.Session:
     s = requests.Session()
     s.headers['User-Agent'] = 'github.com/iltrof/osumapdl'
     retry = Retry(total=retries, read=retries,
                   connect=retries, backoff_factor=backoff,
                   status_forcelist=[429])  # 429 TOO MANY REQUESTS
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pages_in_flight)
     s.mount('http://', adapter)
     s.mount('https://', adapter)
     return s
@@ -67,36 +73,68 @@ if len(sys.argv) == 3:
     out_file = sys.argv[2]
 
 
+# Minimum time between the starts of two page requests.
+request_interval = 1.0
+last_request_start = 0.0
+request_lock = threading.Lock()
+
+
+def wait_for_turn() -> None:
+    global last_request_start
+    with request_lock:
+        now = time.monotonic()
+        delay = last_request_start + request_interval - now
+        if delay > 0:
+            time.sleep(delay)
+            now += delay
+        last_request_start = now
+
+
+def get_played_page(sess: requests.Session, uid: str, offset: int) -> List[Any]:
+    wait_for_turn()
+    try:
+        r = sess.get(
+            f'https://osu.ppy.sh/users/{uid}/beatmapsets/most_played?offset={offset}&limit=51', timeout=10)
+    except requests.ConnectionError:
+        raise ConnectionError(f"Couldn't connect to osu!\n"
+                              "Check if the website even works and try again.")
+
+    if not r.ok:
+        raise ConnectionError(f"osu! returned {r.status_code} {r.reason}.\n"
+                              "This might be a bug, or you might just have to try again.")
+
+    try:
+        return r.json()
+    except:
+        raise RuntimeError(f"osu! is sending unexpected responses.\n"
+                           "This is probably a bug and should be reported.")
+
+
 def get_played_mapsets(uid: str) -> Set[str]:
-    offset = 0
     mapsets = set()
     sess = retrying_session()
+    reached_end = False
 
-    while True:
-        print(offset, end='\r')
-        try:
-            r = sess.get(
-                f'https://osu.ppy.sh/users/{uid}/beatmapsets/most_played?offset={offset}&limit=51', timeout=10)
-        except requests.ConnectionError:
-            raise ConnectionError(f"Couldn't connect to osu!\n"
-                                  "Check if the website even works and try again.")
-
-        if not r.ok:
-            raise ConnectionError(f"osu! returned {r.status_code} {r.reason}.\n"
-                                  "This might be a bug, or you might just have to try again.")
-
-        try:
-            j = r.json()
-        except:
-            raise RuntimeError(f"osu! is sending unexpected responses.\n"
-                               "This is probably a bug and should be reported.")
-        if len(j) == 0:
-            break
+    with ThreadPoolExecutor(max_workers=pages_in_flight) as ex:
+        pending = {ex.submit(get_played_page, sess, uid, offset): offset
+                   for offset in range(0, 51 * pages_in_flight, 51)}
+        next_offset = 51 * pages_in_flight
+
+        while len(pending) > 0:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                offset = pending.pop(fut)
+                j = fut.result()
+                if len(j) == 0:
+                    reached_end = True
+                    continue
+
+                print(offset, end='\r')
+                mapsets.update(m['beatmapset']['id'] for m in j)
 
-        for m in j:
-            mapsets.add(m['beatmapset']['id'])
-        offset += 51
-        time.sleep(1)
+                if not reached_end:
+                    pending[ex.submit(get_played_page, sess, uid, next_offset)] = next_offset
+                    next_offset += 51
 
     return mapsets
 
@@ -111,5 +149,4 @@ except Exception as e:
 print(f'[info] Found {len(mapsets)} total mapsets.')
 print(f'[info] Saving to {out_file}...')
 with open(out_file, 'w') as f:
-    for id in mapsets:
-        f.write(f'{id}\n')
+    f.write(''.join(f'{id}\n' for id in mapsets))